@@ -1,66 +1,200 @@
 import json
 import os
 import argparse
+import hashlib
+import struct
 import mido
+import numpy as np
 
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from typing import Tuple, List
-from math import isclose
 from tqdm import tqdm
 
+try:
+    # orjson is considerably faster than the standard library at parsing the song files
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # ujson is used instead if orjson is not installed
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    # ijson is used to stream very large song files instead of loading them whole
+    import ijson
+except ImportError:
+    ijson = None
+
+# The midi files are written with a resolution of 480 ticks per beat at 120 bpm
+_TICKS_PER_BEAT = 480
+_TEMPO = mido.bpm2tempo(120.0)
+# Seconds per tick, computed the same way as mido.second2tick
+_TICK_SCALE = _TEMPO * 1e-6 / _TICKS_PER_BEAT
+# The fixed parts of the midi files written by list_to_midi_bytes:
+# the header of a type 1 midi file with one track, the set_tempo and program_change messages
+# at the start of the track, and the end_of_track message
+_MIDI_HEADER = struct.pack('>4sLhhh', b'MThd', 6, 1, 1, _TICKS_PER_BEAT)
+_TRACK_START = b'\x00\xff\x51\x03' + _TEMPO.to_bytes(3, 'big') + b'\x00\xc0\x00'
+_TRACK_END = b'\x01\xff\x2f\x00'
+# The extensions of the song json files
+_SONG_EXTENSIONS = ('.json', '.txt')
+# Song files larger than this are streamed with ijson, if it is installed
+_STREAMING_THRESHOLD = 4 * 1024 * 1024
+# The version of the notes cached by load_notes.
+# Bump it whenever the extraction of the notes changes, so that notes cached by older versions are not used.
+_CACHE_VERSION = 1
+# The maximum number of midi files waiting to be saved by extract_songs
+_MAX_PENDING_WRITES = 64
+
+
+def _sounds_to_soa(deemo_notes, compact=False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flattens the sounds of the Deemo notes into parallel arrays, one element per sound.
+    A missing d is stored as NaN, to be resolved by _build_notes.
+
+    :param deemo_notes: An iterable of the notes of a Deemo song dict
+    :param compact: Whether to collect the sounds in typed arrays instead of lists. This is slower, but needs
+                    much less memory when the notes are streamed, as the values are not kept alive by a song dict.
+    :return: A tuple of (times, ws, ds, ps, vs) float64 arrays.
+    """
+    new_column = partial(array, 'd') if compact else list
+    times, ws, ds, ps, vs = new_column(), new_column(), new_column(), new_column(), new_column()
+    # Bind the hot lookups to locals, as they are used once per sound
+    add_time, add_w, add_d, add_p, add_v = times.append, ws.append, ds.append, ps.append, vs.append
+    nan = np.nan
+    try:
+        for deemo_note in deemo_notes:
+            # Skip if there is no sounds, or if sounds is None
+            sounds = deemo_note.get('sounds')
+            if sounds is None:
+                continue
+            # Handle missing _time at the start of the song
+            time = deemo_note.get('_time', 0)
+            for sound in sounds:
+                # Only an absent d is a missing duration, to be resolved by _build_notes.
+                # A d of null is invalid, and would otherwise be turned into NaN.
+                # The duration is looked up before the velocity check, so that a first sound without a duration
+                # is an error even if it is skipped.
+                duration = sound.get('d', nan)
+                if duration is None:
+                    raise TypeError('must be real number, not NoneType')
+                if duration is nan and not times:
+                    raise ValueError('The first note has no duration.')
+                # Handle v lower than 0
+                # For some reason, there are notes with velocity lower than 0.
+                # It is assumed that they don't make any sound, so we skip them.
+                # However, if this assumption is wrong, then the velocity of these notes would be wrong.
+                velocity = sound['v']
+                if velocity <= 0:
+                    continue
+                add_time(time)
+                # w is a relative delay of onset on top of _time
+                add_w(sound.get('w', 0))
+                add_d(duration)
+                add_p(sound['p'])
+                add_v(velocity)
+        # array('d') only accepts real numbers, so a null or a string is rejected here in both modes,
+        # instead of being turned into NaN or parsed by np.array
+        columns = [column if compact else array('d', column) for column in (times, ws, ds, ps, vs)]
+    except TypeError as e:
+        raise TypeError(f'Invalid value in sounds: {e}') from e
+    return tuple(np.frombuffer(column, dtype=np.float64) for column in columns)
+
+
+def _build_notes(times, ws, ds, ps, vs) -> np.ndarray:
+    """
+    Builds the notes from the parallel arrays returned by _sounds_to_soa.
+
+    :return: array of notes of shape (M, 4), unsorted.
+    """
+    # Fill the columns of a single preallocated array instead of stacking temporary arrays
+    converted_notes = np.empty((len(times), 4), dtype=np.float64)
+    on_times = np.add(times, ws, out=converted_notes[:, 0])
+    # Handle missing d
+    # This is based on the assumption that there exists a previous note
+    # and the duration of the previous note is the same as the current note.
+    # Otherwise, it makes little sense to have a note without a duration.
+    # However, if this assumption is wrong, then we may run into an exception.
+    missing = np.isnan(ds)
+    if missing.any():
+        if missing[0]:
+            raise ValueError('The first note has no duration.')
+        # Carry forward the index of the last sound that has a duration
+        previous = np.where(missing, 0, np.arange(len(ds)))
+        np.maximum.accumulate(previous, out=previous)
+        ds = ds[previous]
+    np.add(on_times, ds, out=converted_notes[:, 1])
+    converted_notes[:, 2] = ps
+    converted_notes[:, 3] = vs
+    return converted_notes
+
 
-def extract_one(deemo: dict) -> list:
+def extract_one(deemo: dict) -> np.ndarray:
     """
-    Converts a Deemo song dict to a list of notes.
+    Converts a Deemo song dict to an array of notes.
     The Deemo song dict is obtained directly from reading the Deemo song json file.
-    Each note in the list is in the form of [on_time, off_time, pitch, velocity].
+    Each note in the array is in the form of [on_time, off_time, pitch, velocity].
     Time is absolute time in seconds.
 
     :param deemo: Deemo song dict
-    :return: list of notes
+    :return: float64 array of notes of shape (N, 4)
     """
-    converted_notes = []
-    deemo_notes = deemo['notes']
-    for deemo_note in deemo_notes:
-        # Skip if there is no sounds
-        if 'sounds' not in deemo_note.keys():
-            continue
-        # Skip if sounds is None
-        if deemo_note['sounds'] is None:
-            continue
-        # Handle missing _time at the start of the song
-        time = 0
-        if '_time' in deemo_note.keys():
-            time = deemo_note['_time']
-        for sound in deemo_note['sounds']:
-            # w is a relative delay of onset on top of _time
-            if 'w' in sound.keys():
-                on_time = time + sound['w']
-            else:
-                on_time = time
-            # Handle missing d
-            if 'd' not in sound.keys():
-                # This is based on the assumption that there exists a previous note
-                # and the duration of the previous note is the same as the current note.
-                # Otherwise, it makes little sense to have a note without a duration.
-                # However, if this assumption is wrong, then we may run into an exception.
-                previous_note = converted_notes[-1]
-                duration = previous_note[1] - previous_note[0]
-            else:
-                duration = sound['d']
-            off_time = on_time + duration
-            pitch = sound['p']
-            # Handle v lower than 0
-            # For some reason, there are notes with velocity lower than 0.
-            # It is assumed that they don't make any sound, so we skip them.
-            # However, if this assumption is wrong, then the velocity of these notes would be wrong.
-            if sound['v'] <= 0:
-                continue
-            velocity = sound['v']
-            converted_notes.append([on_time, off_time, pitch, velocity])
-    # Sort the notes by on_time, then by ascending pitch
-    converted_notes.sort(key=lambda x: (x[0], x[2]))
+    return _extract_notes(deemo['notes'])
 
-    return converted_notes
+
+def extract_one_streaming(filename) -> np.ndarray:
+    """
+    Converts a Deemo song json file to an array of notes, the same way as extract_one.
+    The Deemo notes are streamed from the file with ijson one at a time instead of loading the whole file,
+    which keeps the peak memory low on very large song files.
+
+    :param filename: The path to the Deemo song json file.
+    :return: float64 array of notes of shape (N, 4)
+    """
+    with open(filename, 'rb') as f:
+        events = _check_notes_array(ijson.parse(f, use_float=True))
+        return _extract_notes(ijson.items(events, 'notes.item'), compact=True)
+
+
+def _check_notes_array(events):
+    """
+    Passes the ijson parse events through, and raises at the end of the file if it has no top-level notes array.
+    Otherwise, ijson.items would silently yield no notes, where extract_one raises for such a file.
+
+    :param events: The ijson parse events of a Deemo song json file.
+    :return: A generator of the same events.
+    """
+    has_notes_key = has_notes_array = False
+    for prefix, event, value in events:
+        if prefix == '' and event == 'map_key' and value == 'notes':
+            has_notes_key = True
+        elif prefix == 'notes' and event == 'start_array':
+            has_notes_array = True
+        yield prefix, event, value
+    if not has_notes_key:
+        raise KeyError('notes')
+    if not has_notes_array:
+        raise TypeError('notes must be an array')
+
+
+def _extract_notes(deemo_notes, compact=False) -> np.ndarray:
+    """
+    Converts the notes of a Deemo song dict to a sorted array of notes.
+
+    :param deemo_notes: An iterable of the notes of a Deemo song dict
+    :param compact: Passed on to _sounds_to_soa.
+    :return: float64 array of notes of shape (N, 4)
+    """
+    converted_notes = _build_notes(*_sounds_to_soa(deemo_notes, compact))
+    # Sort the notes by on_time, then by ascending pitch
+    order = np.lexsort((converted_notes[:, 2], converted_notes[:, 0]))
+    return converted_notes[order]
 
 
 def load_json(filename):
@@ -70,85 +204,118 @@ def load_json(filename):
     :param filename: The path to the json file.
     :return: The loaded json file.
     """
-    with open(filename, 'r') as f:
-        return json.load(f)
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    if ujson is not None:
+        return ujson.loads(data)
+    return json.loads(data)
+
+
+def notes_to_list(notes) -> List[list]:
+    """
+    Converts an array of notes to a list of notes.
+    Each note in the list is in the form of [on_time, off_time, pitch, velocity], where pitch and velocity are int.
+
+    :param notes: An array of notes, where each note is [start_time, end_time, pitch, velocity].
+    :return: list of notes
+    """
+    return [[on_time, off_time, int(pitch), int(velocity)]
+            for on_time, off_time, pitch, velocity in np.asarray(notes).tolist()]
 
 
 def save_json(converted_notes, filename):
     """
-    Saves a list of notes to a json file.
+    Saves an array of notes to a json file.
 
-    :param converted_notes: A list of notes, where each note is a list of [start_time, end_time, pitch, velocity].
+    :param converted_notes: An array of notes, where each note is [start_time, end_time, pitch, velocity].
     :param filename: The path to the json file.
     """
+    notes = notes_to_list(converted_notes)
+    if orjson is not None:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(notes, option=orjson.OPT_INDENT_2))
+        return
     with open(filename, 'w') as f:
-        json.dump(converted_notes, f, indent=2)
+        json.dump(notes, f, indent=2)
 
 
 def is_equal(notes_a, notes_b) -> Tuple[bool, str]:
     """
-    Compares two lists of notes and returns True if they are equal, False otherwise.
+    Compares two arrays of notes and returns True if they are equal, False otherwise.
 
-    :param notes_a: list of notes
-    :param notes_b: list of notes
+    :param notes_a: array of notes
+    :param notes_b: array of notes
     :return: A tuple of (bool, str), where the first element is True if the notes are equal, False otherwise,
              and the second element is a message indicating the result of the comparison.
     """
     if len(notes_a) != len(notes_b):
         return False, f'Length mismatch: {len(notes_a)} != {len(notes_b)}'
-    num_unmatch = 0
-    for i in range(len(notes_a)):
-        if not isclose(notes_a[i][0], notes_b[i][0], rel_tol=1e-5) or \
-                not isclose(notes_a[i][1], notes_b[i][1], rel_tol=1e-5) or \
-                notes_a[i][2] != notes_b[i][2] or \
-                notes_a[i][3] != notes_b[i][3]:
-            num_unmatch += 1
-            # print(f'Mismatch at index {i}:\n{notes_a[i]}\n{notes_b[i]}')
+    notes_a = np.asarray(notes_a, dtype=np.float64).reshape(-1, 4)
+    notes_b = np.asarray(notes_b, dtype=np.float64).reshape(-1, 4)
+    # Same tolerance as math.isclose(rel_tol=1e-5): relative to the larger magnitude, no absolute tolerance
+    times_a, times_b = notes_a[:, :2], notes_b[:, :2]
+    times_close = np.abs(times_a - times_b) <= 1e-5 * np.maximum(np.abs(times_a), np.abs(times_b))
+    matched = times_close.all(axis=1) & (notes_a[:, 2:] == notes_b[:, 2:]).all(axis=1)
+    num_unmatch = int(np.count_nonzero(~matched))
 
     if num_unmatch > 0:
         return False, f'Notes mismatch: {num_unmatch}/{len(notes_a)} ({num_unmatch / len(notes_a) * 100:.2f}%) notes.'
     return True, 'Notes are equal.'
 
 
+def _note_events(notes) -> np.ndarray:
+    """
+    Splits an array of notes into sorted note on and note off events.
+
+    :param notes: An array of notes, where each note is [start_time, end_time, pitch, velocity].
+    :return: int64 array of note events of shape (2N, 3), where each event is [delta_ticks, pitch, velocity].
+    """
+    # Split notes into on and off events, and convert all seconds to ticks the same way as mido.second2tick
+    notes = np.asarray(notes, dtype=np.float64).reshape(-1, 4)
+    # Raise like mido does, instead of silently truncating a pitch or velocity that is not a whole number
+    data_bytes = notes[:, 2:]
+    if np.any(data_bytes != np.floor(data_bytes)):
+        raise TypeError('data byte must be int')
+    num_notes = len(notes)
+    note_events = np.empty((2 * num_notes, 3), dtype=np.int64)  # [ticks, pitch, velocity]
+    note_events[:num_notes, 0] = np.rint(notes[:, 0] / _TICK_SCALE)
+    note_events[num_notes:, 0] = np.rint(notes[:, 1] / _TICK_SCALE)
+    note_events[:num_notes, 1] = notes[:, 2]
+    note_events[num_notes:, 1] = notes[:, 2]
+    note_events[:num_notes, 2] = notes[:, 3]
+    note_events[num_notes:, 2] = 0
+
+    # Sort note events by ascending order of ticks, then by ascending order of pitch,
+    # then by ascending order of velocity.
+    # Pitch and velocity fit in 8 bits each, so the three keys are packed into a single int64 sort key.
+    sort_keys = (note_events[:, 0] << 16) | (note_events[:, 1] << 8) | note_events[:, 2]
+    note_events = note_events[np.argsort(sort_keys)]
+
+    # Absolute ticks to relative ticks
+    note_events[:, 0] = np.diff(note_events[:, 0], prepend=0)  # [delta_ticks, pitch, velocity]
+    return note_events
+
+
 def list_to_midi(notes) -> mido.MidiFile:
     """
-    Converts a list of notes to a midi file.
+    Converts an array of notes to a midi file.
 
-    :param notes: A list of notes, where each note is a list of [start_time, end_time, pitch, velocity].
+    :param notes: An array of notes, where each note is [start_time, end_time, pitch, velocity].
     :return: A mido.MidiFile object.
     """
-    ticks_per_beat = 480  # default to 480
-    tempo = mido.bpm2tempo(120.0)  # default to 120 bpm
-
     mid = mido.MidiFile()
-    mid.ticks_per_beat = ticks_per_beat
+    mid.ticks_per_beat = _TICKS_PER_BEAT
     track = mido.MidiTrack()
     mid.tracks.append(track)
 
-    track.append(mido.MetaMessage('set_tempo', tempo=tempo))
+    track.append(mido.MetaMessage('set_tempo', tempo=_TEMPO))
     track.append(mido.Message('program_change', program=0, time=0))
 
-    # Split notes into on and off messages, and convert all seconds to ticks
-    note_events = []  # [ticks, pitch, velocity, ticks], where note_events[0] to be converted to delta_ticks
-    for note in notes:
-        start_time, end_time, pitch, velocity = note
-        start_ticks = round(mido.second2tick(start_time, ticks_per_beat, tempo))
-        end_ticks = round(mido.second2tick(end_time, ticks_per_beat, tempo))
-        note_events.append([start_ticks, pitch, velocity, start_ticks])
-        note_events.append([end_ticks, pitch, 0, end_ticks])
-
-    # Sort note events by ascending order of ticks, then by ascending order of pitch,
-    # then by ascending order of velocity
-    note_events.sort(key=lambda x: (x[0], x[1], x[2]))
-
-    # Absolute ticks to relative ticks
-    for i in range(1, len(note_events)):
-        note_events[i][0] = note_events[i][-1] - note_events[i - 1][-1]  # [delta_ticks, pitch, velocity, ticks]
-
     # Add notes
-    for note_event in note_events:
-        delta_ticks, pitch, velocity, _ = note_event
-        track.append(mido.Message('note_on', note=pitch, velocity=velocity, time=delta_ticks))
+    track.extend([mido.Message('note_on', note=pitch, velocity=velocity, time=delta_ticks)
+                  for delta_ticks, pitch, velocity in _note_events(notes).tolist()])
 
     # Add end of track
     track.append(mido.MetaMessage('end_of_track', time=1))
@@ -156,6 +323,51 @@ def list_to_midi(notes) -> mido.MidiFile:
     return mid
 
 
+def list_to_midi_bytes(notes) -> bytes:
+    """
+    Converts an array of notes to the content of a midi file.
+    The result is the same as saving the midi file returned by list_to_midi,
+    but the note events are encoded directly with NumPy instead of creating a mido.Message for each of them.
+
+    :param notes: An array of notes, where each note is [start_time, end_time, pitch, velocity].
+    :return: The content of the midi file.
+    """
+    note_events = _note_events(notes)
+    delta_ticks, pitches, velocities = note_events[:, 0], note_events[:, 1], note_events[:, 2]
+    # Same checks as mido
+    if np.any(delta_ticks < 0):
+        raise ValueError('message time must be non-negative in MIDI file')
+    if np.any((note_events[:, 1:] < 0) | (note_events[:, 1:] > 127)):
+        raise ValueError('data byte must be in range 0..127')
+
+    # The delta ticks are variable-length quantities, with 7 bits per byte
+    num_delta_bytes = np.ones(len(note_events), dtype=np.int64)
+    for shift in range(7, 63, 7):
+        num_delta_bytes += (delta_ticks >> shift) > 0
+    # Each event is the delta ticks followed by the pitch and velocity. The status byte is only needed
+    # for the first event, as the other events share it by running status.
+    event_sizes = num_delta_bytes + 2
+    event_sizes[:1] += 1
+    event_starts = np.cumsum(event_sizes) - event_sizes
+    data = np.empty(int(event_sizes.sum()), dtype=np.uint8)
+    # Write the delta ticks most significant byte first, with the high bit set on all but the last byte
+    for i in range(int(num_delta_bytes.max(initial=0))):
+        has_byte = num_delta_bytes > i
+        remaining_bytes = num_delta_bytes[has_byte] - 1 - i
+        delta_bytes = (delta_ticks[has_byte] >> (7 * remaining_bytes)) & 0x7f
+        delta_bytes[remaining_bytes > 0] |= 0x80
+        data[event_starts[has_byte] + i] = delta_bytes
+    data_starts = event_starts + num_delta_bytes
+    if len(data_starts) > 0:
+        data[data_starts[0]] = 0x90  # note_on on channel 0
+        data_starts[0] += 1
+    data[data_starts] = pitches
+    data[data_starts + 1] = velocities
+
+    track = _TRACK_START + data.tobytes() + _TRACK_END
+    return _MIDI_HEADER + struct.pack('>4sL', b'MTrk', len(track)) + track
+
+
 def filter_files(files: List[str]) -> List[str]:
     """
     Filters the files to only keep the song json files.
@@ -163,32 +375,163 @@ def filter_files(files: List[str]) -> List[str]:
     :param files: A list of file names.
     :return: A list of file names that are json files.
     """
-    allowed_extensions = ['.json', '.txt']
-    return [f for f in files if os.path.splitext(f)[1] in allowed_extensions]
+    return [f for f in files if f.endswith(_SONG_EXTENSIONS)]
+
+
+def _scan_songs(songs_dir) -> List[str]:
+    """
+    Lists the song directories in the directory containing the Deemo songs.
+    Uses os.scandir, so that stray files can be skipped without an extra stat call.
+
+    :param songs_dir: The directory containing the Deemo songs.
+    :return: A list of the names of the song directories.
+    """
+    with os.scandir(songs_dir) as entries:
+        return [entry.name for entry in entries if entry.is_dir()]
+
+
+def _scan_json(song_dir) -> List[str]:
+    """
+    Lists the song json files in the directory of a single song.
+    Uses os.scandir, so that the file type comes with the directory entry without an extra stat call.
+
+    :param song_dir: The directory of a single song.
+    :return: A list of file names of the song json files.
+    """
+    with os.scandir(song_dir) as entries:
+        return filter_files([entry.name for entry in entries if entry.is_file()])
+
+
+def _extract_file(song_path) -> np.ndarray:
+    """
+    Converts a Deemo song json file to an array of notes.
+    Files larger than _STREAMING_THRESHOLD are streamed with extract_one_streaming if ijson is installed.
+
+    :param song_path: The path to the Deemo song json file.
+    :return: float64 array of notes of shape (N, 4)
+    """
+    if ijson is not None and os.path.getsize(song_path) > _STREAMING_THRESHOLD:
+        return extract_one_streaming(song_path)
+    return extract_one(load_json(song_path))
 
 
-def compare_difficulty(song_paths) -> Tuple[bool, str, List[List[list]]]:
+def load_notes(song_path, cache_dir=None) -> np.ndarray:
+    """
+    Loads a Deemo song json file and converts it to an array of notes.
+    If cache_dir is given, the notes are cached there, keyed by _CACHE_VERSION and the path, modification time
+    and size of the file, so that the json file is not parsed again as long as it and the extraction are unchanged.
+
+    :param song_path: The path to the Deemo song json file.
+    :param cache_dir: The directory to cache the notes in, or None to disable caching.
+    :return: float64 array of notes of shape (N, 4)
+    """
+    if cache_dir is None:
+        return _extract_file(song_path)
+    stat = os.stat(song_path)
+    key = f'{_CACHE_VERSION}:{os.path.abspath(song_path)}:{stat.st_mtime_ns}:{stat.st_size}'
+    cache_path = os.path.join(cache_dir, f'{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.npy')
+    try:
+        notes = np.load(cache_path)
+        if notes.dtype == np.float64 and notes.ndim == 2 and notes.shape[1] == 4:
+            return notes
+    except Exception:
+        # Not cached yet, or the cache file is unreadable, e.g. empty or truncated after a crash.
+        # Either way, it is a cache miss, and the cache file is overwritten below.
+        pass
+    notes = _extract_file(song_path)
+    # Write to a temporary file first, so that other workers never read a partially written cache file
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.save(f, notes)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # The notes are extracted already, so a failure to cache them is not an error
+        print(f'Warning: failed to cache the notes of {song_path}: {e}')
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return notes
+
+
+def _fingerprint(notes) -> bytes:
+    """
+    Computes a digest of the exact content of an array of notes.
+    Equal fingerprints imply equal notes, but notes that are equal within the tolerance of is_equal
+    may still have different fingerprints.
+
+    :param notes: An array of notes.
+    :return: A 16-byte digest.
+    """
+    return hashlib.blake2b(np.ascontiguousarray(notes, dtype=np.float64), digest_size=16).digest()
+
+
+def compare_difficulty(song_paths, cache_dir=None) -> Tuple[bool, str, List[np.ndarray]]:
     """
     Checks whether the notes of different difficulties of a single song are the same.
 
     :param song_paths: A list of paths to the json files of the different difficulties of a single song.
-    :return: A tuple of (bool, str, List[List[list]]), where the first element is True if the notes are equal,
+    :param cache_dir: The directory to cache the extracted notes in, or None to disable caching.
+    :return: A tuple of (bool, str, List[np.ndarray]), where the first element is True if the notes are equal,
              False otherwise, the second element is a message indicating the result of the comparison,
              and the third element is a list of the extracted notes of the different difficulties.
     """
-    notes_list = [extract_one(load_json(song_path)) for song_path in song_paths]
+    # Load the difficulties on a few threads, so that reading a file overlaps with parsing the previous one
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        notes_list = list(pool.map(partial(load_notes, cache_dir=cache_dir), song_paths))
+    fingerprints = [_fingerprint(notes) for notes in notes_list]
     # Compare the i-th difficulty with the (i+1)-th difficulty
     for i in range(len(notes_list) - 1):
+        # Identical notes have identical fingerprints, so only differing pairs are compared note by note
+        if fingerprints[i] == fingerprints[i + 1]:
+            continue
         equal, message = is_equal(notes_list[i], notes_list[i + 1])
         if not equal:
             return False, message, notes_list
     return True, 'Notes are equal.', notes_list
 
 
+def _check_one_song(args) -> Tuple[str, List[str], bool, bool]:
+    """
+    Checks a single song for check_songs. This runs in a worker process.
+
+    :param args: A tuple of (songs_dir, song, suppress_length, suppress_notes).
+    :return: A tuple of (str, List[str], bool, bool), where the first element is the song, the second element is
+             a list of messages to print, and the third and fourth elements are True if the song has difficulties
+             with different lengths and different notes respectively.
+    """
+    songs_dir, song, suppress_length, suppress_notes = args
+    messages = []
+    files = _scan_json(os.path.join(songs_dir, song))
+    # Check the number of difficulties
+    if len(files) < 2:
+        messages.append(f'{song} has less than 2 difficulties.')
+        return song, messages, False, False
+    # Attempt to extract the notes from the json files and compare them
+    try:
+        same, message, notes_list = compare_difficulty([os.path.join(songs_dir, song, f) for f in files])
+    except Exception as e:
+        messages.append(f'{song} Read error: {e}')
+        return song, messages, False, False
+    length_mismatch = message.startswith('Length mismatch')
+    if length_mismatch and not suppress_length:
+        messages.append(f'{song} {message}')
+    notes_mismatch = message.startswith('Notes mismatch')
+    if notes_mismatch and not suppress_notes:
+        messages.append(f'{song} {message}')
+    # Attempt to convert the notes to midi
+    try:
+        for notes in notes_list:
+            _ = list_to_midi_bytes(notes)
+    except Exception as e:
+        messages.append(f'{song} Conversion error: {e}')
+    return song, messages, length_mismatch, notes_mismatch
+
+
 def check_songs(songs_dir, suppress_length, suppress_notes) -> Tuple[List[str], List[str]]:
     """
     Iterates through all the songs in the directory and compares the notes of different difficulties
-    to see if they are the same.
+    to see if they are the same. The songs are checked in parallel by a pool of worker processes.
 
     :param songs_dir: The directory containing the Deemo songs.
     :param suppress_length: Whether to suppress the length mismatch messages.
@@ -197,85 +540,127 @@ def check_songs(songs_dir, suppress_length, suppress_notes) -> Tuple[List[str],
              with different lengths, and the second element is a list of songs that have difficulties with different
              notes.
     """
-    songs = os.listdir(songs_dir)
-    length_mismatch_songs = []
-    notes_mismatch_songs = []
+    songs = _scan_songs(songs_dir)
+    # Sets, so that the mismatched songs are deduplicated as they are added
+    length_mismatch_songs = set()
+    notes_mismatch_songs = set()
     messages = []
-    for song in tqdm(songs):
-        files = os.listdir(os.path.join(songs_dir, song))
-        # Only keep the json files
-        files = filter_files(files)
-        # Check the number of difficulties
-        if len(files) < 2:
-            messages.append(f'{song} has less than 2 difficulties.')
-            continue
-        # Attempt to extract the notes from the json files and compare them
-        try:
-            same, message, notes_list = compare_difficulty([os.path.join(songs_dir, song, f) for f in files])
-        except Exception as e:
-            messages.append(f'{song} Read error: {e}')
-            continue
-        if message.startswith('Length mismatch'):
-            if not suppress_length:
-                messages.append(f'{song} {message}')
-            length_mismatch_songs.append(song)
-        if message.startswith('Notes mismatch'):
-            if not suppress_notes:
-                messages.append(f'{song} {message}')
-            notes_mismatch_songs.append(song)
-        # Attempt to convert the notes to midi
-        try:
-            for notes in notes_list:
-                _ = list_to_midi(notes)
-        except Exception as e:
-            messages.append(f'{song} Conversion error: {e}')
-            continue
+    args = [(songs_dir, song, suppress_length, suppress_notes) for song in songs]
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(_check_one_song, args, chunksize=8)
+        for song, song_messages, length_mismatch, notes_mismatch in tqdm(results, total=len(songs)):
+            messages.extend(song_messages)
+            if length_mismatch:
+                length_mismatch_songs.add(song)
+            if notes_mismatch:
+                notes_mismatch_songs.add(song)
     # Print the messages
     for message in messages:
         print(message)
-    # Deduplicate the mismatched songs
-    length_mismatch_songs = list(set(length_mismatch_songs))
-    notes_mismatch_songs = list(set(notes_mismatch_songs))
     print('Comparison done.')
     print(f'{len(length_mismatch_songs)}/{len(songs)} ({len(length_mismatch_songs) / len(songs) * 100:.2f}%) songs '
           f'have difficulties with different lengths.')
     print(f'{len(notes_mismatch_songs)}/{len(songs)} ({len(notes_mismatch_songs) / len(songs) * 100:.2f}%) songs '
           f'have difficulties with different notes.')
-    return length_mismatch_songs, notes_mismatch_songs
+    return list(length_mismatch_songs), list(notes_mismatch_songs)
+
+
+def _write_file(filename, data: bytes):
+    """
+    Writes bytes to a file.
+    The content is already complete in memory, so it is written with raw os.write calls
+    instead of going through a buffered file object.
+
+    :param filename: The path to the file.
+    :param data: The content of the file.
+    """
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _wait_write(filename, future):
+    """
+    Waits for a background write of a file to finish, and prints the error if it failed.
+
+    :param filename: The path to the file.
+    :param future: The future of the write.
+    """
+    try:
+        future.result()
+    except OSError as e:
+        print(f'Error saving {filename}: {e}')
+
+
+def _extract_one_song(args) -> Tuple[List[str], List[Tuple[str, bytes]]]:
+    """
+    Converts a single song for extract_songs. This runs in a worker process.
+    The midi files are returned as bytes instead of being saved, so that the main process can write them
+    in the background.
+
+    :param args: A tuple of (songs_dir, output_dir, song, one_only).
+    :return: A tuple of (List[str], List[Tuple[str, bytes]]), where the first element is a list of messages to print,
+             and the second element is a list of (path, content) of the midi files to save.
+    """
+    songs_dir, output_dir, song, one_only = args
+    files = _scan_json(os.path.join(songs_dir, song))
+    if len(files) < 2:
+        return [f'Skipping {song} because it has less than 2 difficulties.'], []
+    file_paths = [os.path.join(songs_dir, song, f) for f in files]
+    cache_dir = os.path.join(output_dir, '.extract_cache')
+    midi_files = []
+    try:
+        if one_only:
+            # The largest file is used as a proxy for the difficulty with the most number of notes,
+            # so that only one of the difficulties has to be extracted
+            notes = load_notes(max(file_paths, key=os.path.getsize), cache_dir)
+            midi_files.append((os.path.join(output_dir, f'{song}.mid'), list_to_midi_bytes(notes)))
+            return [], midi_files
+        same, _, notes_list = compare_difficulty(file_paths, cache_dir=cache_dir)
+        if same:
+            # If the notes are the same, we save the one with the most number of notes
+            max_notes = max(notes_list, key=len)
+            midi_files.append((os.path.join(output_dir, f'{song}.mid'), list_to_midi_bytes(max_notes)))
+        else:
+            # If the notes are different, we need to convert all the difficulties
+            for i, notes in enumerate(notes_list):
+                midi_files.append((os.path.join(output_dir, f'{os.path.splitext(files[i])[0]}.mid'),
+                                   list_to_midi_bytes(notes)))
+    except Exception as e:
+        return [f'Error converting {song}: {e}'], midi_files
+    return [], midi_files
 
 
 def extract_songs(songs_dir, output_dir, one_only=False):
     """
     Converts all the Deemo songs in the directory to midi files.
+    The songs are converted in parallel by a pool of worker processes,
+    and the midi files are saved by a background thread while the next songs are being converted.
 
     :param songs_dir: The directory containing the Deemo songs.
     :param output_dir: The directory to save the midi files.
-    :param one_only: Whether to randomly convert only one difficulty to midi even if the notes are not the same.
+    :param one_only: Whether to convert only the difficulty with the largest song file to midi,
+                     even if the notes are not the same.
     :return: None
     """
-    songs = os.listdir(songs_dir)
-    for song in tqdm(songs):
-        files = os.listdir(os.path.join(songs_dir, song))
-        # Only keep the json files
-        files = filter_files(files)
-        if len(files) < 2:
-            print(f'Skipping {song} because it has less than 2 difficulties.')
-            continue
-        try:
-            same, _, notes_list = compare_difficulty([os.path.join(songs_dir, song, f) for f in files])
-            if one_only or same:
-                # If the notes are the same, we save the one with the most number of notes
-                max_notes = max(notes_list, key=len)
-                midi = list_to_midi(max_notes)
-                midi.save(os.path.join(output_dir, f'{song}.mid'))
-            else:
-                # If the notes are different, we need to convert all the difficulties
-                for i, notes in enumerate(notes_list):
-                    midi = list_to_midi(notes)
-                    midi.save(os.path.join(output_dir, f'{os.path.splitext(files[i])[0]}.mid'))
-        except Exception as e:
-            print(f'Error converting {song}: {e}')
-            continue
+    songs = _scan_songs(songs_dir)
+    args = [(songs_dir, output_dir, song, one_only) for song in songs]
+    pending_writes = deque()
+    with ProcessPoolExecutor() as executor, ThreadPoolExecutor(max_workers=1) as writer:
+        for messages, midi_files in tqdm(executor.map(_extract_one_song, args, chunksize=8), total=len(songs)):
+            for message in messages:
+                print(message)
+            for filename, data in midi_files:
+                pending_writes.append((filename, writer.submit(_write_file, filename, data)))
+            # Bound the number of midi files held in memory while waiting to be saved
+            while len(pending_writes) > _MAX_PENDING_WRITES:
+                _wait_write(*pending_writes.popleft())
+        while pending_writes:
+            _wait_write(*pending_writes.popleft())
 
 
 def main():
@@ -295,7 +680,9 @@ def main():
     parser.add_argument('--one_only', action='store_true', required=False,
                         help='Only convert one difficulty to midi even if '
                              'the notes are not the same when using --extract. '
-                             'Uses the difficulty with the most number of notes. '
+                             'Uses the difficulty with the largest song file, '
+                             'which usually is the one with the most number of notes, '
+                             'so that only one difficulty has to be extracted. '
                              'In case of a tie, any one may be chosen. '
                              'Defaults to False.')
     # Suppress length flag
@@ -309,10 +696,8 @@ def main():
     args = parser.parse_args()
 
     if args.single:
-        deemo_notes = load_json(args.single[0])
-        notes = extract_one(deemo_notes)
-        midi = list_to_midi(notes)
-        midi.save(args.single[1])
+        notes = load_notes(args.single[0])
+        _write_file(args.single[1], list_to_midi_bytes(notes))
     elif args.check:
         _ = check_songs(args.check[0], args.suppress_length, args.suppress_notes)
     elif args.extract: